@@ -0,0 +1,25 @@
+"""CSV helpers for saving the data tables created by this package.
+
+pyarrow is used when it is installed since its multithreaded writer is
+several times faster than pandas.DataFrame.to_csv on string-heavy tables;
+otherwise pandas is used. Both produce files read back identically by
+pandas.read_csv.
+"""
+try:
+    import pyarrow
+    import pyarrow.csv
+except ImportError:  # pyarrow is an optional dependency
+    pyarrow = None
+
+
+def write(df, file_name):
+    """Save 'df' with a header row and without its index into 'file_name'."""
+    if pyarrow is not None:
+        try:
+            table = pyarrow.Table.from_pandas(df, preserve_index=False)
+        except pyarrow.ArrowException:
+            pass  # e.g. a column mixing types; let pandas handle it
+        else:
+            pyarrow.csv.write_csv(table, file_name)
+            return
+    df.to_csv(file_name, header=True, index=False)
@@ -0,0 +1,198 @@
+"""HTTP helpers reusing connections to Google APIs across requests.
+
+urllib.request.urlopen opens a new TCP and TLS connection for every request.
+Since all the requests made by this package go to the same host, the helpers
+here keep one persistent connection per host and thread instead, which saves
+the handshakes on every request but the first one.
+"""
+import functools
+import http.client
+import os
+import shutil
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+
+_local = threading.local()
+
+# size of the chunks in which downloads are written to files
+_CHUNK_SIZE = 64 * 1024
+
+# redirects followed and the limit on them, the same as urllib.request
+_REDIRECT_CODES = (301, 302, 303, 307, 308)
+_MAX_REDIRECTIONS = urllib.request.HTTPRedirectHandler.max_redirections
+
+
+def _get_connection(scheme, netloc, timeout):
+    """Return the persistent connection of this thread to 'netloc'."""
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = dict()
+
+    conn = connections.get((scheme, netloc))
+    if conn is None:
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(netloc, timeout=timeout)
+        else:
+            conn = http.client.HTTPConnection(netloc, timeout=timeout)
+        connections[(scheme, netloc)] = conn
+    return conn
+
+
+def _drop_connection(scheme, netloc):
+    conn = getattr(_local, "connections", dict()).pop((scheme, netloc), None)
+    if conn is not None:
+        conn.close()
+
+
+def _send(url, timeout):
+    """Send a GET request to 'url' and return the response before its body
+    is read, retrying once on a reused connection closed by the server."""
+    parsed = urllib.parse.urlsplit(url)
+    path = parsed.path or "/"
+    if parsed.query:
+        path += "?" + parsed.query
+
+    for attempt in range(2):
+        conn = _get_connection(parsed.scheme, parsed.netloc, timeout)
+        reused = conn.sock is not None
+        try:
+            conn.request("GET", path)
+            return conn.getresponse()
+        except (http.client.HTTPException, OSError) as e:
+            _drop_connection(parsed.scheme, parsed.netloc)
+            # the server may have closed an idle connection; retry once
+            if reused and attempt == 0:
+                continue
+            if isinstance(e, OSError):
+                raise
+            raise IOError(f"HTTP request to {parsed.netloc} failed: {e!r}")
+
+
+def _release(url, response):
+    """Release the connection of a fully read response."""
+    if response.will_close:
+        parsed = urllib.parse.urlsplit(url)
+        _drop_connection(parsed.scheme, parsed.netloc)
+
+
+def _finish(url, response):
+    """Release the connection of a fully read response and check its status."""
+    _release(url, response)
+    if not 200 <= response.status < 300:
+        raise urllib.error.HTTPError(url, response.status, response.reason,
+                                     response.headers, None)
+
+
+def _read(url, response, f=None):
+    """Read the body of 'response', into the file object 'f' if given."""
+    try:
+        if f is None:
+            return response.read()
+        shutil.copyfileobj(response, f, _CHUNK_SIZE)
+    except (http.client.HTTPException, OSError) as e:
+        parsed = urllib.parse.urlsplit(url)
+        _drop_connection(parsed.scheme, parsed.netloc)
+        if isinstance(e, OSError):
+            raise
+        raise IOError(f"HTTP request to {parsed.netloc} failed: {e!r}")
+
+
+@functools.lru_cache(maxsize=None)
+def _get_proxies():
+    """Return the proxies set in the environment, read once per process
+    since reading them takes longer than sending a request on a
+    persistent connection."""
+    return urllib.request.getproxies()
+
+
+def _use_urllib(url):
+    # fall back to urllib, which handles proxies set in the environment
+    return urllib.parse.urlsplit(url).scheme in _get_proxies()
+
+
+def _open(url, timeout):
+    """Send a GET request to 'url', following redirects the same way as
+    urllib.request.urlopen, and return the final URL with its response
+    before its body is read."""
+    for _ in range(_MAX_REDIRECTIONS + 1):
+        if _use_urllib(url):
+            return url, urllib.request.urlopen(url, timeout=timeout)
+        response = _send(url, timeout)
+        location = response.getheader("Location")
+        if response.status not in _REDIRECT_CODES or location is None:
+            return url, response
+        # the body of a redirect is read only to reuse the connection
+        _read(url, response)
+        _release(url, response)
+        url = urllib.parse.urljoin(url, location)
+    raise urllib.error.HTTPError(url, response.status, "Too many redirects",
+                                 response.headers, None)
+
+
+def get(url, timeout=30):
+    """Send a GET request to 'url' and return the body of the response.
+
+    Parameters
+    ----------
+    url: str
+        URL to request
+    timeout: float, optional (default=30)
+        Timeout in seconds for connecting and for each blocking read.
+
+    Returns
+    -------
+    body: bytes
+        Body of the response.
+
+    Raises
+    ------
+    IOError
+        If the request fails or the final response after redirects
+        has a status outside 2xx.
+    """
+    url, response = _open(url, timeout)
+    with response:
+        body = _read(url, response)
+        _finish(url, response)
+    return body
+
+
+def download(url, file_name, timeout=30):
+    """Send a GET request to 'url' and save the body of the response.
+
+    The body is streamed to a temporary file in chunks, which is renamed to
+    'file_name' once complete, so that the whole body is never held in
+    memory and an interrupted download does not leave a partial file.
+
+    Parameters
+    ----------
+    url: str
+        URL to request
+    file_name: str
+        Name of the file to save the body into.
+    timeout: float, optional (default=30)
+        Timeout in seconds for connecting and for each blocking read.
+
+    Raises
+    ------
+    IOError
+        If the request fails or the final response after redirects
+        has a status outside 2xx.
+    """
+    tmp_name = f"{file_name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_name, "wb") as f:
+            url, response = _open(url, timeout)
+            with response:
+                if 200 <= response.status < 300:
+                    _read(url, response, f)
+                else:
+                    _read(url, response)
+                _finish(url, response)
+        os.replace(tmp_name, file_name)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        raise
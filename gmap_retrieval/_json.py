@@ -0,0 +1,67 @@
+"""JSON helpers shared by the modules reading and writing API responses.
+
+orjson is used when it is installed since it encodes and decodes the small
+json documents handled by this package several times faster than the
+standard library; otherwise the standard json module is used.
+"""
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # orjson is an optional dependency
+    orjson = None
+
+
+def loads(data):
+    """Deserialize 'data' (bytes or str) containing a JSON document."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def load(file_name):
+    """Deserialize the JSON document saved in 'file_name'."""
+    with open(file_name, "rb") as f:
+        return loads(f.read())
+
+
+def dump(obj, file_name):
+    """Serialize 'obj' as a JSON document into 'file_name'."""
+    if orjson is not None:
+        data = orjson.dumps(obj)
+    else:
+        data = json.dumps(obj).encode('utf-8')
+    with open(file_name, "wb") as f:
+        f.write(data)
+
+
+def load_cached(file_name, cache=None, empty=None, dir_fd=None):
+    """Deserialize 'file_name', reusing the result of a previous call.
+
+    Results are kept in 'cache', a dict owned by the caller, so that they
+        live only as long as the caller keeps the dict, e.g. for the passes
+        of one pipeline run over the same files, and it holds one entry
+        per file read; if 'cache' is None, nothing is cached.
+    The cache is keyed by the identity, modification time and size of the
+        file, so a file rewritten in between is read again.
+    The returned object is shared between callers and must not be modified.
+    If the file is empty, 'empty' is returned without reading the file.
+    If 'dir_fd' is given, 'file_name' is relative to that directory.
+    """
+    st = os.stat(file_name, dir_fd=dir_fd)
+    if st.st_size == 0:
+        return empty
+
+    key = (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+    if cache is not None and key in cache:
+        return cache[key]
+
+    with open(file_name, "rb",
+              opener=lambda path, flags: os.open(path, flags,
+                                                 dir_fd=dir_fd)) as f:
+        obj = loads(f.read())
+
+    if cache is not None:
+        cache[key] = obj
+    return obj
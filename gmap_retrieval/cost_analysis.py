@@ -1,12 +1,30 @@
-import glob
-import json
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import os
 import pandas as pd
+from .nearby_places import DEFAULT_PLACE_TYPES, load_saved_results
+
+# default pricing table: USD per 1000 requests for each price range, which
+# starts at the corresponding threshold of the number of requests
+DEFAULT_PRICES = {'static_maps': [2, 1.6], 'nearby_search': [40, 32],
+                  'static_street_view': [7, 5.6],
+                  'places_details(atmosphere)': [22, 17.6]}
+DEFAULT_THRESHOLDS = np.array([0, 100000])
+
+
+def _count_ext(path, ext):
+    """Count regular files in 'path' whose names end with 'ext'."""
+    n = 0
+    with os.scandir(path) as it:
+        for entry in it:
+            if (entry.name.endswith(ext)
+                    and entry.is_file(follow_symlinks=False)):
+                n += 1
+    return n
 
 
 def get_n_api_calls(n_loc, satellite, nearby_places, street_view, reviews,
-                    place_types=None):
+                    place_types=None, cache=None):
     """Calculate # of API calls per location when using methods in this API.
 
     This function should be used to retrospectively predict the number of
@@ -29,6 +47,10 @@ def get_n_api_calls(n_loc, satellite, nearby_places, street_view, reviews,
         A path to the directory created by get_reviews method
     place_types: list
         'place_types' variable used as input to 'get_nearby_places' method.
+    cache: dict, optional (default=None)
+        Dict in which the decoded json files of 'nearby_places' are kept.
+        Pass the same dict as to create_csv_nearby_places to skip decoding
+            the files again; if None, nothing is kept.
 
     Returns
     n_api_calls_per_loc: pandas.DataFrame
@@ -39,46 +61,27 @@ def get_n_api_calls(n_loc, satellite, nearby_places, street_view, reviews,
     if type(satellite) is int:
         n_static_map = satellite
     elif type(satellite) is str:
-        n_static_map = len(glob.glob1(satellite, "*.png"))/n_loc
+        n_static_map = _count_ext(satellite, ".png")/n_loc
     else:
         raise ValueError("satellite has to be either int or str.")
 
     # when place types are not specified
     if place_types is None:
-        place_types = [
-            'accounting', 'airport', 'amusement_park', 'aquarium',
-            'art_gallery', 'atm', 'bakery', 'bank', 'bar', 'beauty_salon',
-            'bicycle_store', 'book_store', 'bowling_alley', 'bus_station',
-            'cafe', 'campground', 'car_dealer', 'car_rental', 'car_repair',
-            'car_wash', 'casino', 'cemetery', 'church', 'city_hall',
-            'clothing_store', 'convenience_store', 'courthouse', 'dentist',
-            'department_store', 'doctor', 'drugstore', 'electrician',
-            'electronics_store', 'embassy', 'fire_station', 'florist',
-            'funeral_home', 'furniture_store', 'gas_station',
-            'grocery_or_supermarket', 'gym', 'hair_care', 'hardware_store',
-            'hindu_temple', 'home_goods_store', 'hospital', 'insurance_agency',
-            'jewelry_store', 'laundry', 'lawyer', 'library',
-            'light_rail_station', 'liquor_store', 'local_government_office',
-            'locksmith', 'lodging', 'meal_delivery', 'meal_takeaway', 'mosque',
-            'movie_rental', 'movie_theater', 'moving_company', 'museum',
-            'night_club', 'painter', 'park', 'parking', 'pet_store',
-            'pharmacy', 'physiotherapist', 'plumber', 'police', 'post_office',
-            'primary_school', 'real_estate_agency', 'restaurant',
-            'roofing_contractor', 'rv_park', 'school', 'secondary_school',
-            'shoe_store', 'shopping_mall', 'spa', 'stadium', 'storage',
-            'store', 'subway_station', 'supermarket', 'synagogue',
-            'taxi_stand', 'tourist_attraction', 'train_station',
-            'transit_station', 'travel_agency', 'university',
-            'veterinary_care', 'zoo'
-        ]
+        place_types = DEFAULT_PLACE_TYPES
 
     # get the number of nearby search API requests made based on data
-    count = np.zeros((n_loc, len(place_types)))
-    for i, sub_dir in enumerate(os.listdir(nearby_places)):
-        for j, p_type in enumerate(place_types):
-            file_name = f"{nearby_places}/{sub_dir}/{p_type}.json"
-            with open(file_name, "r") as f:
-                count[i, j] = len(json.load(f)['results'])
+    # the files are small and many, so read them concurrently
+    with os.scandir(nearby_places) as it:
+        sub_dirs = [entry.path for entry in it if entry.is_dir()]
+
+    def count_results(sub_dir):
+        return [len(results)
+                for results in load_saved_results(sub_dir, place_types, cache)]
+
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        count = np.array(list(executor.map(count_results, sub_dirs)),
+                         dtype=float).reshape(len(sub_dirs), len(place_types))
     # single API request of nearby search can return up to 20 results
     n_nearby_search = ((np.ceil(count / 20).sum().astype(int)
                         + (count == 0).sum()) / n_loc)
@@ -88,15 +91,17 @@ def get_n_api_calls(n_loc, satellite, nearby_places, street_view, reviews,
         n_street_view = street_view
 
     elif type(street_view) is str:
-        counts = np.zeros(len(os.listdir(street_view)))
-        for i, sub_dir in enumerate(os.listdir(street_view)):
-            counts[i] = len(glob.glob1(f"{street_view}/{sub_dir}", "*.png"))
+        with os.scandir(street_view) as it:
+            sub_dirs = [entry.path for entry in it if entry.is_dir()]
+        counts = np.fromiter((_count_ext(sub_dir, ".png")
+                              for sub_dir in sub_dirs),
+                             dtype=float, count=len(sub_dirs))
         n_street_view = counts.mean()
     else:
         raise ValueError("street_view has to be either int or str.")
 
     # get the number of places details API requests made based on data
-    n_reviews = len(glob.glob1(reviews, "*.json")) / n_loc
+    n_reviews = _count_ext(reviews, ".json") / n_loc
 
     n_api_calls_per_loc = pd.Series(
         [n_static_map, n_nearby_search, n_street_view, n_reviews],
@@ -168,31 +173,28 @@ def calculate_cost(n_loc, price_table, n_api_calls_per_loc, extra_expense=0):
             the 200 discount you get every month from Google.
     """
     if price_table is None:  # if default pricing table is used
-        price_table = {'static_maps': [2, 1.6], 'nearby_search': [40, 32],
-                       'static_street_view': [7, 5.6],
-                       'places_details(atmosphere)': [22, 17.6]}
-        price_table = pd.DataFrame(price_table.values(),
-                                   index=price_table.keys(),
-                                   columns=[0, 100000])
+        api_names = list(DEFAULT_PRICES)
+        prices_per_1000 = np.array(list(DEFAULT_PRICES.values()))
+        thresholds = DEFAULT_THRESHOLDS
+    else:
+        api_names = list(price_table.index)
+        prices_per_1000 = price_table.values
+        thresholds = price_table.columns.values
 
     # check input is appropriate
-    if set(n_api_calls_per_loc.index) != set(price_table.index):
+    if set(n_api_calls_per_loc.index) != set(api_names):
         raise ValueError("Indices of n_api_calls_per_loc and price_table have "
                          "to be identical.")
 
-    n_api_calls = n_api_calls_per_loc * n_loc
+    n_api_calls = np.array([n_api_calls_per_loc[name] for name in api_names],
+                           dtype=float) * n_loc
 
-    prices = dict()
-    for index, row in price_table.iterrows():
-        n_calls_by_range = np.maximum(
-            n_api_calls[index] - price_table.columns.values, 0)
-        for i in range(len(n_calls_by_range) - 1):
-            n_calls_by_range[i] -= n_calls_by_range[i + 1]
-        prices[index] = np.sum(
-            n_calls_by_range * (price_table.loc[index] / 1000)
-            )
+    # number of calls exceeding each threshold, shape [n_API, n_price_range]
+    n_calls_over = np.maximum(n_api_calls[:, np.newaxis] - thresholds, 0)
+    # number of calls falling into each price range
+    n_calls_by_range = -np.diff(n_calls_over, axis=1, append=0)
+    prices = (n_calls_by_range * (prices_per_1000 / 1000)).sum(axis=1)
 
-    total = sum(prices.values()) + extra_expense
+    total = prices.sum() + extra_expense
 
-    return pd.Series([total] + list(prices.values()),
-                     index=["total"] + list(prices.keys()))
+    return pd.Series([total] + list(prices), index=["total"] + api_names)
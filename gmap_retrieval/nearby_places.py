@@ -1,9 +1,66 @@
-import json
+from joblib import Parallel, delayed
 import numpy as np
 import os
 import pandas as pd
 import time
-import urllib
+from . import _csv, _http, _json
+
+# a list of primary place types taken from https://developers.google.com/places/supported_types
+DEFAULT_PLACE_TYPES = ('accounting', 'airport', 'amusement_park', 'aquarium', 'art_gallery', 'atm', 'bakery', 'bank',
+                       'bar', 'beauty_salon', 'bicycle_store', 'book_store', 'bowling_alley', 'bus_station', 'cafe',
+                       'campground', 'car_dealer', 'car_rental', 'car_repair', 'car_wash', 'casino', 'cemetery', 'church',
+                       'city_hall', 'clothing_store', 'convenience_store', 'courthouse', 'dentist', 'department_store',
+                       'doctor', 'drugstore', 'electrician', 'electronics_store', 'embassy', 'fire_station', 'florist',
+                       'funeral_home', 'furniture_store', 'gas_station', 'grocery_or_supermarket', 'gym', 'hair_care',
+                       'hardware_store', 'hindu_temple', 'home_goods_store', 'hospital', 'insurance_agency',
+                       'jewelry_store', 'laundry', 'lawyer', 'library', 'light_rail_station', 'liquor_store',
+                       'local_government_office', 'locksmith', 'lodging', 'meal_delivery', 'meal_takeaway', 'mosque',
+                       'movie_rental', 'movie_theater', 'moving_company', 'museum', 'night_club', 'painter', 'park',
+                       'parking', 'pet_store', 'pharmacy', 'physiotherapist', 'plumber', 'police', 'post_office',
+                       'primary_school', 'real_estate_agency', 'restaurant', 'roofing_contractor', 'rv_park', 'school',
+                       'secondary_school', 'shoe_store', 'shopping_mall', 'spa', 'stadium', 'storage', 'store',
+                       'subway_station', 'supermarket', 'synagogue', 'taxi_stand', 'tourist_attraction', 'train_station',
+                       'transit_station', 'travel_agency', 'university', 'veterinary_care', 'zoo')
+
+# content of the empty json files saved for requests with ZERO_RESULTS status
+NO_RESULTS = {"status": "ZERO_RESULTS", "results": []}
+
+def load_saved_results(directory_name, place_types, cache=None):
+    """Load the results saved by get_nearby_places for a single location.
+
+    Where the platform supports it, the json files are opened relative to the directory,
+        so that its path is resolved only once instead of once per place type.
+
+    Parameters
+    ----------
+    directory_name: str
+        name of the sub-directory created by get_nearby_places for a location
+    place_types: list
+        list of place types whose results are loaded
+    cache: dict, optional (default=None)
+        dict in which the decoded files are kept, so that passing the same dict again skips decoding them;
+        if None, the files are decoded every time
+
+    Returns
+    -------
+    results: list of list, [n_place_types]
+        'results' of the saved API responses; an empty list for a place type without any result
+        or whose request failed, in which case no json file is saved
+        the lists may be shared with 'cache' and must not be modified
+    """
+    def load(file_name, dir_fd=None):
+        try:
+            return _json.load_cached(file_name, cache, empty=NO_RESULTS, dir_fd=dir_fd)["results"]
+        except FileNotFoundError:
+            return NO_RESULTS["results"]
+
+    if {os.open, os.stat} <= os.supports_dir_fd:
+        dir_fd = os.open(directory_name, os.O_RDONLY)
+        try:
+            return [load(f"{place_type}.json", dir_fd) for place_type in place_types]
+        finally:
+            os.close(dir_fd)
+    return [load(f"{directory_name}/{place_type}.json") for place_type in place_types]
 
 def use_nearby_search(url, next_page=False, request_count=0):
     """Call nearby search API request.
@@ -13,7 +70,9 @@ def use_nearby_search(url, next_page=False, request_count=0):
     url: str
         URL to use to send a Nearby Search Request in Google Maps Place Search API
     next_page: boolean, optional(default=False)
-        whether or not the URL is to request next page using next_page_token
+        whether or not the URL is to request next page using next_page_token;
+        if True, waits 3 seconds before each request since a next_page_token becomes valid only shortly after
+            it is issued; other locations keep being retrieved meanwhile when get_nearby_places runs with n_jobs > 1
     request_count: int, optional(default=0)
         the count of the previously-sent same requests; used only when next_page=True
 
@@ -32,11 +91,11 @@ def use_nearby_search(url, next_page=False, request_count=0):
         try:
             # get API response
             print("API request made.")
-            response = urllib.request.urlopen(url)
+            response = _http.get(url)
         except IOError:
             pass # retry
         else: # if no IOError occurs
-            data = json.loads(response.read().decode('utf-8'))
+            data = _json.loads(response)
             status = data['status']
             if status == "OK":
                 break
@@ -44,12 +103,9 @@ def use_nearby_search(url, next_page=False, request_count=0):
                 if request_count >= 3:
                     print(f"Failed to receive a valid API response for 3 times for {url}.")
                     break # stop requesting after 3 trials
-                else:
+                else: # resend the same request after waiting again
                     print("...Key is not valid yet.")
                     request_count += 1
-                    data, status = use_nearby_search(url + "&request_count=" + str(request_count), next_page,
-                                                     request_count)
-                    break
             else:
                 break
     return data, status
@@ -73,13 +129,19 @@ def concat_next_page(data, next_page):
     # concat 'results'
     data['results'].extend(next_page["results"])
 
-def get_nearby_places(directory_name, API_key, IDs, latitude_longitude, radius=1, place_types=None, verbose=True):
+def get_nearby_places(directory_name, API_key, IDs, latitude_longitude, radius=1, place_types=None, n_jobs=1,
+                      verbose=True):
     """Get a list of places around specific locations specified by latitudes and longitudes using Google Maps Place Search API.
 
     Note that maximum number of properties you can obstain from this method
         for each [place, place type] pair (which are specified by [latitude_longitude, place_types]) pair is 60.
     This is due to the limitation of Google Maps Place Search API, check the details at:
         https://developers.google.com/places/web-service/search
+    For a [place, place type] pair without any result (ZERO_RESULTS status), an empty (zero-byte) json file is saved
+        instead of the API response; json.load fails on such a file, so read it as NO_RESULTS,
+        e.g. with load_saved_results, or check for an empty file before parsing it.
+    Files saved by earlier versions of this package for such pairs contain the full API response instead,
+        and are read the same way.
 
     Paramters
     ---------
@@ -100,62 +162,67 @@ def get_nearby_places(directory_name, API_key, IDs, latitude_longitude, radius=1
         Notice that this entry doesn't ensure that properties in collected data belong to a place type specified by this entry
             since this just specifies key words for search
             to make that sure, re-check the 'types' property in the collected json files
+            (empty files hold no result; see above)
         Hence, alternatively, you can put a list of any key words here instead of place types of Google Map,
             then all properties matching with any of the key words are returned
+    n_jobs: int, optional (default=1)
+        the number of locations whose data are retrieved concurrently; specify -1 to use as many as CPU cores
+        since the retrieval waits on network responses, threads are used and values above the number of cores are fine
     verbose: boolean, optional (default=True)
         whether or not to print the progress of the data retrieval
     """
 
-    # a list of primary place types taken from https://developers.google.com/places/supported_types
     if place_types is None:
-        place_types = ['accounting', 'airport', 'amusement_park', 'aquarium', 'art_gallery', 'atm', 'bakery', 'bank',
-                       'bar', 'beauty_salon', 'bicycle_store', 'book_store', 'bowling_alley', 'bus_station', 'cafe',
-                       'campground', 'car_dealer', 'car_rental', 'car_repair', 'car_wash', 'casino', 'cemetery', 'church',
-                       'city_hall', 'clothing_store', 'convenience_store', 'courthouse', 'dentist', 'department_store',
-                       'doctor', 'drugstore', 'electrician', 'electronics_store', 'embassy', 'fire_station', 'florist',
-                       'funeral_home', 'furniture_store', 'gas_station', 'grocery_or_supermarket', 'gym', 'hair_care',
-                       'hardware_store', 'hindu_temple', 'home_goods_store', 'hospital', 'insurance_agency',
-                       'jewelry_store', 'laundry', 'lawyer', 'library', 'light_rail_station', 'liquor_store',
-                       'local_government_office', 'locksmith', 'lodging', 'meal_delivery', 'meal_takeaway', 'mosque',
-                       'movie_rental', 'movie_theater', 'moving_company', 'museum', 'night_club', 'painter', 'park',
-                       'parking', 'pet_store', 'pharmacy', 'physiotherapist', 'plumber', 'police', 'post_office',
-                       'primary_school', 'real_estate_agency', 'restaurant', 'roofing_contractor', 'rv_park', 'school',
-                       'secondary_school', 'shoe_store', 'shopping_mall', 'spa', 'stadium', 'storage', 'store',
-                       'subway_station', 'supermarket', 'synagogue', 'taxi_stand', 'tourist_attraction', 'train_station',
-                       'transit_station', 'travel_agency', 'university', 'veterinary_care', 'zoo']
+        place_types = DEFAULT_PLACE_TYPES
 
     elif type(place_types) is not list:
         raise TypeError("place_types must be a list.")
 
+    # indexed by position below, whatever the index of the given Series;
+    # the places around an ID listed more than once are searched only once,
+    # around its first location, as they are saved in the same directory
+    locations = dict()
+    for ID, location in zip(IDs, latitude_longitude):
+        locations.setdefault(str(ID), location)
+    IDs = list(locations)
+    latitude_longitude = list(locations.values())
+
     # create URLs
     prefix = "https://maps.googleapis.com/maps/api/place/nearbysearch/json?"
-    locations = "location=" + latitude_longitude
-    radius_meters = "&radius=" + str(radius*1000)
-    keyword = "&keyword=" + pd.Series(place_types)
     key = "&key=" + API_key
+    suffixes = [f"&radius={radius*1000}&keyword={place_type}{key}" for place_type in place_types]
 
     # create directory to put all the json files
     directory = directory_name
     if not os.path.exists(directory):
         os.makedirs(directory)
 
-    # get info about properties around the locations specified by 'ID'
-    for i in range(len(IDs)):
+    # json files already retrieved in previous runs, scanned once instead of checking each file separately
+    existing_files = dict()
+    with os.scandir(directory) as it:
+        for sub_dir in it:
+            if sub_dir.is_dir():
+                with os.scandir(sub_dir.path) as files:
+                    existing_files[sub_dir.name] = {f.name for f in files if f.name.endswith(".json")}
+
+    def get_places_for_each_id(i): # get info about properties around the location specified by 'ID'
         ID = str(IDs[i])
 
         # create directory to put all json files about the location specified by 'ID'
         lower_dir = f"{ID}"
-        if not os.path.exists(f"{directory}/{lower_dir}"):
-            os.mkdir(f"{directory}/{lower_dir}")
+        if lower_dir not in existing_files:
+            os.makedirs(f"{directory}/{lower_dir}", exist_ok=True)
+        existing = existing_files.get(lower_dir, set())
 
-        # 'urls' is an np.array, [n_place_types], that includes all URLs for a specific place, specified by 'ID'
-        urls = prefix + locations[i] + radius_meters + keyword + key
+        # 'urls' is a list, [n_place_types], that includes all URLs for a specific place, specified by 'ID'
+        location = prefix + "location=" + latitude_longitude[i]
+        urls = [location + suffix for suffix in suffixes]
 
         # loop through different types of propeties around the location specified by 'ID'
         for j in range(len(place_types)):
             url = urls[j]
             place_type = place_types[j]
-            if os.path.exists(f"{directory}/{lower_dir}/{place_type}.json"):
+            if f"{place_type}.json" in existing:
                 if verbose:
                     print(f"{directory}/{lower_dir}/{place_type}.json already exists.")
                 continue
@@ -184,19 +251,21 @@ def get_nearby_places(directory_name, API_key, IDs, latitude_longitude, radius=1
             if status == 'OK':
                 if verbose:
                     print(f"...Created {directory}/{lower_dir}/{place_type}.json")
-                with open(f"{directory}/{lower_dir}/{place_type}.json", "w") as f:
-                    json.dump(data, f)
+                _json.dump(data, f"{directory}/{lower_dir}/{place_type}.json")
             elif status == 'ZERO_RESULTS':
                 if verbose:
                     print(f"...Created {directory}/{lower_dir}/{place_type}.json; No result for {ID}-{place_type}")
-                with open(f"{directory}/{lower_dir}/{place_type}.json", "w") as f:
-                    json.dump(data, f)
+                # an empty file stands for a response without any result
+                open(f"{directory}/{lower_dir}/{place_type}.json", "wb").close()
             else:
                 print(f"The status of response is: {status} for {ID}-{place_type}.")
         if verbose:
             print(f"Finished retrieving data for {ID}\n")
 
-def create_csv_nearby_places(directory_name, place_types, file_name=None):
+    # get info about properties around the locations specified by 'IDs'
+    Parallel(n_jobs, prefer="threads")(delayed(get_places_for_each_id)(i) for i in range(len(IDs)))
+
+def create_csv_nearby_places(directory_name, place_types, file_name=None, cache=None):
     """Create data table from directory created by get_nearby_places function and save it into csv file.
 
     Parameters
@@ -207,6 +276,9 @@ def create_csv_nearby_places(directory_name, place_types, file_name=None):
         list of place types to search for
     file_name: str, optional (default=None)
         name of csv file; if None, the file name becomes f"{directory_name}.csv"
+    cache: dict, optional (default=None)
+        dict in which the decoded json files are kept; pass the same dict to get_n_api_calls
+            to skip decoding the files again there; if None, nothing is kept
 
     Returns
     -------
@@ -221,48 +293,26 @@ def create_csv_nearby_places(directory_name, place_types, file_name=None):
         print(f"{file_name} already exists!")
         return pd.read_csv(file_name)
 
-    IDs = []
-    types = []
-    name = []
-    place_id = []
-    price_level = []
-    rating = []
-    n_rating = []
-    loc = []
-
-    for ID in os.listdir(directory_name):
-        for place_type in place_types:
-            file_name = f"{directory_name}/{ID}/{place_type}.json"
-            with open(file_name, 'r') as f:
-                results = json.load(f)["results"]
-            for i in range(len(results)):
-                if place_type not in results[i]['types']:
-                    continue
-                IDs += [ID]
-                types += [place_type]
-                name += [results[i]['name']]
-                place_id += [results[i]['place_id']]
-                try:
-                    price_level += [results[i]['price_level']]
-                except KeyError:
-                    price_level += [np.nan]
-                try:
-                    rating += [results[i]['rating']]
-                except KeyError:
-                    rating += [np.nan]
-                try:
-                    n_rating += [results[i]['user_ratings_total']]
-                    if results[i]['user_ratings_total'] == 0:
-                        rating[-1] = np.nan
-                except KeyError:
-                    n_rating += [np.nan]
-                loc += [",".join([str(i) for i in results[i]['geometry']['location'].values()])]
+    def rows(): # yield one row of the data table per property
+        with os.scandir(directory_name) as it:
+            sub_dirs = [entry for entry in it if entry.is_dir()]
+        for sub_dir in sub_dirs:
+            ID = sub_dir.name
+            for place_type, results in zip(place_types, load_saved_results(sub_dir.path, place_types, cache)):
+                for result in results:
+                    if place_type not in result['types']:
+                        continue
+                    n_rating = result.get('user_ratings_total', np.nan)
+                    # rating of a place without any user rating is meaningless
+                    rating = result.get('rating', np.nan) if n_rating != 0 else np.nan
+                    loc = ",".join([str(i) for i in result['geometry']['location'].values()])
+                    yield (ID, place_type, result['name'], result['place_id'], result.get('price_level', np.nan), rating,
+                           n_rating, loc)
 
     columns = ["id", "type", "name", "place_id", 'price_level', 'rating', 'n_rating', 'loc']
 
-    df = pd.DataFrame({"id": IDs, "type": types, "name": name, "place_id": place_id, 'price_level': price_level,
-                       'rating': rating, 'n_rating': n_rating, 'loc': loc})
+    df = pd.DataFrame.from_records(rows(), columns=columns)
 
-    df.to_csv(f"{directory_name}.csv", header=True, index=False)
+    _csv.write(df, f"{directory_name}.csv")
 
     return df
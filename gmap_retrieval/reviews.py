@@ -1,9 +1,9 @@
-import json
+from joblib import Parallel, delayed
 import os
 import pandas as pd
-import urllib
+from . import _csv, _http, _json
 
-def get_reviews(directory_name, API_key, place_id, verbose=True):
+def get_reviews(directory_name, API_key, place_id, n_jobs=1, verbose=True):
     """Retrieve and save reviews of properties through Google Map Places Details API as json files.
 
     Parameters
@@ -14,43 +14,53 @@ def get_reviews(directory_name, API_key, place_id, verbose=True):
         key for Google Map API
     place_id: list
         list of place IDs of Google Map of which the method get reviews
+    n_jobs: int, optional (default=1)
+        the number of places whose reviews are retrieved concurrently; specify -1 to use as many as CPU cores
+        since the retrieval waits on network responses, threads are used and values above the number of cores are fine
     verbose: boolean, optional (default=True)
         whether or not to print the progress of the data retrieval
     """
     if not os.path.exists(directory_name):
         os.makedirs(directory_name)
 
-    prefix = "https://maps.googleapis.com/maps/api/place/details/json?"
-    place_id_ = "place_id=" + pd.Series(place_id)
-    fields = "&fields=name,place_id,type,review"
-    key = "&key=" + API_key
+    prefix = "https://maps.googleapis.com/maps/api/place/details/json?place_id="
+    suffix = "&fields=name,place_id,type,review" + "&key=" + API_key
 
-    urls = prefix + place_id_ + fields + key
+    # indexed by position below, whatever the index of a given Series;
+    # a place listed more than once, e.g. near several locations, is
+    # requested only once
+    place_id = list(dict.fromkeys(map(str, place_id)))
+    urls = [prefix + str(p_id) + suffix for p_id in place_id]
 
-    for i in range(len(place_id_)):
+    # json files already retrieved in previous runs
+    with os.scandir(directory_name) as it:
+        existing = {entry.name for entry in it if entry.name.endswith(".json")}
+
+    def get_single_review(i):
         url = urls[i]
 
-        if os.path.exists(f"{directory_name}/{place_id[i]}.json"):
+        if f"{place_id[i]}.json" in existing:
             if verbose:
                 print(f"{directory_name}/{place_id[i]}.json already exists.")
-            continue
+            return
 
         while True:
             try:
                 # get API response
                 if verbose:
                     print("API request made.")
-                response = urllib.request.urlopen(url)
+                response = _http.get(url)
             except IOError:
                 pass # retry
             else: # if no IOError occurs
-                data = json.loads(response.read().decode('utf-8'))
+                data = _json.loads(response)
                 if verbose:
                     print(f"...Created {directory_name}/{place_id[i]}.json")
-                with open(f"{directory_name}/{place_id[i]}.json", "w") as f:
-                    json.dump(data, f)
+                _json.dump(data, f"{directory_name}/{place_id[i]}.json")
                 break
 
+    Parallel(n_jobs, prefer="threads")(delayed(get_single_review)(i) for i in range(len(urls)))
+
 def create_csv_reviews(directory_name, file_name=None):
     """Create data table from directory created by get_reviews function and save it into csv file.
 
@@ -73,39 +83,25 @@ def create_csv_reviews(directory_name, file_name=None):
         print(f"{file_name} already exists!")
         return None
 
-    place_id = []
-    place_name = []
-    review_text = []
-    review_rating = []
-    review_time = []
-    review_language = []
-
-    for place_json in os.listdir(directory_name):
-        if place_json.startswith("."):
-            continue
-        file_name = f"{directory_name}/{place_json}"
-        with open(file_name, 'r') as f:
-            results = json.load(f)["result"]
-
-        try:
-            for review in results["reviews"]:
-                place_id += [results["place_id"]]
-                place_name += [results["name"]]
-                review_text += [review["text"]]
-                review_rating += [review["rating"]]
-                review_time += [review["time"]]
-                try:
-                    review_language += [review["language"]]
-                except KeyError:
-                    review_language += ["na"]
-        except KeyError:
-            continue
+    def rows(): # yield one row of the data table per review
+        with os.scandir(directory_name) as it:
+            place_jsons = [entry.path for entry in it if not entry.name.startswith(".") and entry.is_file()]
+        for place_json in place_jsons:
+            results = _json.load(place_json)["result"]
+
+            try:
+                place_rows = []
+                for review in results["reviews"]:
+                    place_rows.append((results["place_id"], results["name"], review["text"], review["rating"],
+                                       review["time"], review.get("language", "na")))
+            except KeyError:
+                continue
+            yield from place_rows
 
     columns = ["place_id", "place_name", "review_text", "review_rating", 'review_time', 'review_language']
 
-    df = pd.DataFrame({"place_id": place_id, "place_name": place_name, "review_text": review_text,
-                       "review_rating": review_rating, 'review_time': review_time, 'review_language': review_language})
+    df = pd.DataFrame.from_records(rows(), columns=columns)
 
-    df.to_csv(f"{directory_name}.csv", header=True, index=False)
+    _csv.write(df, f"{directory_name}.csv")
 
     return df
@@ -1,11 +1,38 @@
-import contextlib
-import joblib
-from joblib import Parallel, delayed
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import hashlib
 import numpy as np
 import os
-import pandas as pd
+import shutil
+import threading
+import time
 from tqdm.auto import tqdm
-import urllib
+from . import _http
+
+# delays in seconds before retrying a failed download, doubled after
+# each failure up to 6 times, i.e. up to 32 seconds
+_RETRY_DELAY = 0.5
+_MAX_RETRY_DOUBLINGS = 6
+
+# each zoom level halves the coverage of the previous one
+_ZOOM_SCALES = 0.5 ** np.arange(22)
+
+
+def _cache_path(cache_dir, url):
+    """Return the path of the cached image for 'url' in 'cache_dir'.
+
+    The API key is left out of the hash since it does not change the image.
+    """
+    h = hashlib.sha1(url.split("&key=")[0].encode()).hexdigest()
+    return f"{cache_dir}/{h[:2]}/{h}.png"
+
+
+def _link_or_copy(source, file_name):
+    """Hardlink 'source' to 'file_name', or copy it if linking fails."""
+    try:
+        os.link(source, file_name)
+    except OSError:  # e.g. on different file systems
+        shutil.copyfile(source, file_name)
 
 
 def find_zoom_level(latitudes, horizontal_coverage, horizontal_size):
@@ -13,7 +40,7 @@ def find_zoom_level(latitudes, horizontal_coverage, horizontal_size):
 
     Parameters
     ----------
-    latitudes: pandas.Series, [n_places]
+    latitudes: array-like, [n_places]
         list of latitudes for the centers of satellite images
     horizontal_coverage: int
         ideal horizontal length of the image coverage in km
@@ -24,39 +51,38 @@ def find_zoom_level(latitudes, horizontal_coverage, horizontal_size):
     -------
     zoom_levels: np.array, [n_places]
         list of best zoom levels for places
-    actual_horizontal_coverage: list of str, [n_places]
+    actual_horizontal_coverage: np.array, [n_places]
         list of actual coverages of expected satellite images
     """
-    # sort 'latitudes' from low to high with its original indices
-    sorted_latitudes = sorted(zip(latitudes, range(len(latitudes))),
-                              key=lambda pair: pair[0])
-
-    zoom_levels = np.zeros(len(latitudes))
-    actual_horizontal_coverage = np.zeros(len(latitudes))
-
-    best_zoom = 1
-    for lat, index in sorted_latitudes:
-        for zoom in range(best_zoom-1, 22):
-            meter_per_pixel = (156543.03392 * np.cos(lat * np.pi / 180)
-                               / (2**zoom))
-            horizontal_coverage_in_km = (meter_per_pixel
-                                         * np.array(horizontal_size) / 1000)
-            # if covered area is still too large
-            if horizontal_coverage_in_km > horizontal_coverage:
-                prev_ratio = ((horizontal_coverage_in_km / horizontal_coverage)
-                              ** 2)
-                prev_horizontal_coverage_in_km = horizontal_coverage_in_km
-            else:  # now covered area is too small
-                ratio = (horizontal_coverage / horizontal_coverage_in_km) ** 2
-                break
-        # if a bigger coverage is closer to the ideal coverage than smaller one
-        if ratio <= prev_ratio:
-            zoom_levels[index] = zoom
-            actual_horizontal_coverage[index] = horizontal_coverage_in_km
-        # if a smaller coverage is closer to the ideal coverage than bigger one
-        else:
-            zoom_levels[index] = zoom - 1
-            actual_horizontal_coverage[index] = prev_horizontal_coverage_in_km
+    latitudes = np.asarray(latitudes, dtype=float)
+    max_zoom = len(_ZOOM_SCALES) - 1
+
+    # horizontal coverage in km at zoom level 0; each zoom level halves it
+    coverages_zoom0 = (156543.03392 * np.cos(latitudes * np.pi / 180)
+                       * horizontal_size / 1000)
+
+    # the smallest zoom level whose coverage is not larger than the ideal one,
+    # estimated with a logarithm and corrected for its rounding errors
+    with np.errstate(divide="ignore"):
+        estimate = np.ceil(np.log2(coverages_zoom0 / horizontal_coverage))
+    zoom = np.clip(estimate, 0, max_zoom).astype(int)
+    zoom += ((zoom < max_zoom)
+             & (coverages_zoom0 * _ZOOM_SCALES[zoom] > horizontal_coverage))
+    zoom -= ((zoom > 0) & (coverages_zoom0 * _ZOOM_SCALES[zoom - 1]
+                           <= horizontal_coverage))
+    horizontal_coverage_in_km = coverages_zoom0 * _ZOOM_SCALES[zoom]
+    prev_horizontal_coverage_in_km = (coverages_zoom0
+                                      * _ZOOM_SCALES[np.maximum(zoom - 1, 0)])
+
+    ratio = (horizontal_coverage / horizontal_coverage_in_km) ** 2
+    prev_ratio = (prev_horizontal_coverage_in_km / horizontal_coverage) ** 2
+    # use the bigger coverage of the previous zoom level if it is closer to
+    # the ideal coverage
+    use_bigger = (ratio > prev_ratio) & (zoom > 0)
+    zoom_levels = np.where(use_bigger, zoom - 1, zoom)
+    actual_horizontal_coverage = np.where(use_bigger,
+                                          prev_horizontal_coverage_in_km,
+                                          horizontal_coverage_in_km)
 
     return zoom_levels.astype(int), actual_horizontal_coverage
 
@@ -64,7 +90,7 @@ def find_zoom_level(latitudes, horizontal_coverage, horizontal_size):
 def get_satellite_image(directory_name, API_key, IDs, latitude_longitude,
                         horizontal_coverage=2, horizontal_size=640,
                         image_ratio=1, image_scale=1, image_format="png",
-                        n_jobs=1, verbose=True):
+                        n_jobs=1, cache_dir=None, verbose=True):
     """Save satellite images for specified locations using Google API.
     For details of API, check:
     https://developers.google.com/maps/documentation/maps-static/start .
@@ -95,6 +121,17 @@ def get_satellite_image(directory_name, API_key, IDs, latitude_longitude,
         Scaling on the size.
     image_format: str, optional (default="png")
         Format of output images.
+    n_jobs: int, optional (default=1)
+        The number of images to download concurrently.
+        Specify -1 to use as many as the CPU cores.
+        Downloads run in threads since they mostly wait on the network,
+        so values larger than the number of CPU cores are fine.
+    cache_dir: str, optional (default=None)
+        Directory in which downloaded images are cached by URL,
+            e.g. os.path.expanduser("~/.cache/gmap_retrieval").
+        Images found in the cache are not downloaded again, even when
+            they are saved under different IDs or in another directory.
+        If None, no cache is used.
     verbose: boolean, optional (default=True)
         Whether or not to print the progress of the data retrieval.
     """
@@ -107,93 +144,127 @@ def get_satellite_image(directory_name, API_key, IDs, latitude_longitude,
         raise ValueError("horizontal_size * image_ratio has to be "
                          "a positive number no bigger than 640.")
 
-    @contextlib.contextmanager
-    def tqdm_joblib(tqdm_object):
-        """Context manager to patch joblib to report into tqdm progress bar"""
-        class TqdmBatchCompletionCallback(joblib.parallel.BatchCompletionCallBack):
-            def __init__(self, *args, **kwargs):
-                super().__init__(*args, **kwargs)
-
-            def __call__(self, *args, **kwargs):
-                tqdm_object.update(n=self.batch_size)
-                return super().__call__(*args, **kwargs)
-
-        old_batch_callback = joblib.parallel.BatchCompletionCallBack
-        joblib.parallel.BatchCompletionCallBack = TqdmBatchCompletionCallback
-        try:
-            yield tqdm_object
-        finally:
-            joblib.parallel.BatchCompletionCallBack = old_batch_callback
-            tqdm_object.close()
-
     def get_single_sat_image(i):
         url = urls[i]
-        file_name = directory_name + "/" + str(IDs[i]) + ".png"
+        file_name = file_names[i]
 
-        if os.path.exists(file_name):
-            skip_id[i] = 1
+        if cache_dir is not None:
+            cache_path = _cache_path(cache_dir, url)
+            if os.path.exists(cache_path):
+                _link_or_copy(cache_path, file_name)
+                save_coverage(i)
+                return
+
+        if cache_dir is None:
+            target = file_name
         else:
-            while True:
-                try:
-                    # get API response
-                    image = urllib.request.urlopen(url).read()
-                except IOError:
-                    pass  # retry
-                else:
-                    # save the png image
-                    with open(file_name, mode="wb") as f:
-                        f.write(image)
-                    break
+            # store the image in the cache, then link it
+            target = cache_path
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+
+        n_failures = 0
+        while True:
+            try:
+                # save the png image from API response
+                _http.download(url, target)
+            except IOError:
+                # retry, backing off so that concurrent workers do not keep
+                # hitting the API while it is rate limiting or unavailable
+                # the exponent is capped since 0.5 * 2 ** n_failures
+                # overflows a float after 1024 failures
+                time.sleep(_RETRY_DELAY
+                           * 2 ** min(n_failures, _MAX_RETRY_DOUBLINGS))
+                n_failures += 1
+            else:
+                break
+
+        if cache_dir is not None:
+            _link_or_copy(cache_path, file_name)
+        save_coverage(i)
+
+    def copy_sat_image(i, source):
+        """Copy the image of ids[source] having the same URL as ids[i]."""
+        # the same ID given twice at the same location has its image already
+        if file_names[i] != file_names[source]:
+            shutil.copyfile(file_names[source], file_names[i])
+        save_coverage(i)
+
+    def save_coverage(i):
+        """Append the actual coverage of the new image of ids[i] to the csv.
+
+        Rows are written as soon as each image is saved, so that the csv
+        stays complete when the retrieval is interrupted and resumed.
+        """
+        horizontal = float(actual_horizontal[i])
+        row = [ids[i], f"{horizontal}x{horizontal * image_ratio}"]
+        with csv_lock:
+            csv_writer.writerow(row)
+            csv_file.flush()
+
+    # create a directory to save satellite images
+    if not os.path.exists(directory_name):
+        os.makedirs(directory_name)
+
+    # images already retrieved in previous runs, listed once instead of
+    # checking each file separately
+    with os.scandir(directory_name) as it:
+        existing_files = {entry.name for entry in it}
+
+    # only the remaining locations are processed further
+    ids = []
+    locations = []
+    for ID, location in zip(IDs, latitude_longitude):
+        ID = str(ID)
+        if ID + ".png" not in existing_files:
+            ids.append(ID)
+            locations.append(location)
+    file_names = [f"{directory_name}/{ID}.png" for ID in ids]
 
     # Find the best zoom levels to feed into Google Maps Static API and
     # resulting side lengths of satellite images
-    latitudes = (latitude_longitude
-                 .apply(lambda x: x.split(",")[0]).astype(float))
+    latitudes = [float(location.split(",")[0]) for location in locations]
     zoom_levels, actual_horizontal = find_zoom_level(
         latitudes=latitudes, horizontal_coverage=horizontal_coverage,
         horizontal_size=horizontal_size)
 
     # crate URLs
     prefix = "https://maps.googleapis.com/maps/api/staticmap?"
-    center = "center=" + latitude_longitude
-    zoom = "&zoom=" + pd.Series(zoom_levels, dtype=str)
     size = "&size=" + str(horizontal_size) + "x" + str(vertical_size)
     scale = "&scale=" + str(image_scale)
     form = "&format=" + image_format
     maptype = "&maptype=" + "satellite"
     key = "&key=" + API_key
+    suffix = size + scale + form + maptype + key
 
-    urls = prefix + center + zoom + size + scale + form + maptype + key
+    urls = [f"{prefix}center={center}&zoom={zoom}{suffix}"
+            for center, zoom in zip(locations, zoom_levels)]
 
-    # create a directory to save satellite images
-    if not os.path.exists(directory_name):
-        os.makedirs(directory_name)
-        csv_exist = False
-    else:
-        csv_exist = True
-
-    skip_id = np.zeros(len(IDs))
-    if verbose:  # with progress bar
-        with tqdm_joblib(tqdm(desc='Data Retrieval Progress',
-                              total=len(IDs))) as progress_bar:
-            Parallel(n_jobs)(delayed(get_single_sat_image)(i)
-                             for i in range(len(IDs)))
-    else:  # without progress bar
-        Parallel(n_jobs)(delayed(get_single_sat_image)(i)
-                         for i in range(len(IDs)))
+    # IDs at the same location share the same URL; download it only once
+    first_index = dict()
+    new_ids = []
+    duplicates = []
+    for i in range(len(ids)):
+        if urls[i] in first_index:
+            duplicates.append((i, first_index[urls[i]]))
+        else:
+            first_index[urls[i]] = i
+            new_ids.append(i)
 
     # save actual side lengths of newly saved satellite images
-    actual_horizontal_new = pd.Series(actual_horizontal[skip_id == 0],
-                                      dtype=str)
-    actual_vertical_new = pd.Series(actual_horizontal_new * image_ratio,
-                                    dtype=str)
-    actual_coverage = actual_horizontal_new + 'x' + actual_vertical_new
-    new_data = pd.DataFrame({'id': IDs[skip_id == 0],
-                             'actual_coverage': actual_coverage})
-    if csv_exist:
-        with open(f"{directory_name}/image_coverage.csv", "a") as f:
-            new_data.to_csv(f, index=False, header=False)
-
-    else:
-        with open(f"{directory_name}/image_coverage.csv", "w") as f:
-            new_data.to_csv(f, index=False)
+    csv_name = f"{directory_name}/image_coverage.csv"
+    csv_exist = os.path.exists(csv_name)
+    csv_lock = threading.Lock()
+    with open(csv_name, "a", newline="") as csv_file:
+        csv_writer = csv.writer(csv_file, lineterminator="\n")
+        if not csv_exist:
+            csv_writer.writerow(["id", "actual_coverage"])
+
+        # follow joblib's n_jobs: -1 means all CPU cores, -2 all but one...
+        if n_jobs < 0:
+            n_jobs = max((os.cpu_count() or 1) + 1 + n_jobs, 1)
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            list(tqdm(executor.map(get_single_sat_image, new_ids),
+                      desc='Data Retrieval Progress', total=len(new_ids),
+                      disable=not verbose))
+        for i, source in duplicates:
+            copy_sat_image(i, source)
@@ -1,18 +1,41 @@
 import base64
+from concurrent.futures import ThreadPoolExecutor
 import contextlib
-import fnmatch
+import csv
 import hashlib
 import hmac
 import joblib
 from joblib import Parallel, delayed
-import json
 import numpy as np
-import numpy.random as npr
-import pandas as pd
 import os
+import threading
+import time
 from tqdm.auto import tqdm
-import urllib
+import urllib.error
 import urllib.parse as urlparse
+from . import _http, _json
+
+# delays in seconds before retrying a failed request, doubled after each
+# failure up to 6 times, i.e. up to 32 seconds
+_RETRY_DELAY = 0.5
+_MAX_RETRY_DOUBLINGS = 6
+# number of attempts after which a failing request is given up
+_MAX_ATTEMPTS = 10
+
+def _retry_delay(n_failures):
+    """Return the delay in seconds before retrying a request that has
+    failed 'n_failures' times."""
+    return _RETRY_DELAY * 2 ** min(n_failures - 1, _MAX_RETRY_DOUBLINGS)
+
+def _is_transient(error):
+    """Return whether a request that failed with 'error' may succeed later.
+
+    Network errors, rate limiting (429) and server errors (5xx) may, while
+    other HTTP errors, e.g. 403 for an invalid key or signature, do not.
+    """
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code == 429 or error.code >= 500
+    return True
 
 def sign_url(input_urls=None, secret=None):
     """ Sign a request URL with a URL signing secret.
@@ -36,31 +59,48 @@ def sign_url(input_urls=None, secret=None):
         raise Exception("Both input_urls and secret are required")
 
     if type(input_urls) is str:
-        input_urls = pd.Series([input_urls])
+        input_urls = [input_urls]
+
+    # Decode the private key into its binary format
+    # We need to decode the URL-encoded private key
+    decoded_key = base64.urlsafe_b64decode(secret)
+
+    def split(input_url):
+        # URLs of the simple form built by this package are split by hand,
+        # which is several times faster than urlparse
+        scheme, sep, rest = input_url.partition("://")
+        netloc, slash, path_query = rest.partition("/")
+        if (scheme in ("https", "http") and sep and slash and "?" in path_query
+                and not any(c in path_query for c in "#;")):
+            return f"{scheme}://{netloc}", "/" + path_query
 
-    signed_urls = [""]*len(input_urls)
-    for i, input_url in enumerate(input_urls):
         url = urlparse.urlparse(input_url)
+        return f"{url.scheme}://{url.netloc}", url.path + "?" + url.query
 
-        # We only need to sign the path+query part of the string
-        url_to_sign = url.path + "?" + url.query
+    # We only need to sign the path+query part of the string
+    split_urls = [split(input_url) for input_url in input_urls]
+    urls_to_sign = [url_to_sign for _, url_to_sign in split_urls]
 
-        # Decode the private key into its binary format
-        # We need to decode the URL-encoded private key
-        decoded_key = base64.urlsafe_b64decode(secret)
+    # Create a signature using the private key and the URL-encoded
+    # string using HMAC SHA1. This signature will be binary.
+    # The URLs to sign usually share a long prefix, which is fed to HMAC
+    # only once; each URL then continues from a copy of that state.
+    common_prefix = os.path.commonprefix(urls_to_sign)
+    prefix_signature = hmac.new(decoded_key, common_prefix.encode(),
+                                hashlib.sha1)
 
-        # Create a signature using the private key and the URL-encoded
-        # string using HMAC SHA1. This signature will be binary.
-        signature = hmac.new(decoded_key, str.encode(url_to_sign), hashlib.sha1)
+    def sign(origin, url_to_sign):
+        signature = prefix_signature.copy()
+        signature.update(url_to_sign[len(common_prefix):].encode())
 
         # Encode the binary signature into base64 for use within a URL
         encoded_signature = base64.urlsafe_b64encode(signature.digest())
 
-        original_url = (url.scheme + "://" + url.netloc + url.path + "?"
-                        + url.query)
+        return (f"{origin}{url_to_sign}"
+                f"&signature={encoded_signature.decode()}")
 
-        signed_urls[i] = (original_url + "&signature="
-                          + encoded_signature.decode())
+    signed_urls = [sign(origin, url_to_sign)
+                   for origin, url_to_sign in split_urls]
 
     # Return signed URL
     return signed_urls
@@ -87,7 +127,7 @@ def get_lat_lon(loc, d, tc):
 
     Returns
     -------
-    lat_lon: pandas Series of str
+    lat_lon: numpy array of str
         location(s), specified by latitude and longitude,
         that is 'd' km away from 'loc' in direction 'tc'
         each location needs to be a comma-separated {latitude,longitude} pair;
@@ -112,46 +152,102 @@ def get_lat_lon(loc, d, tc):
 
     # if loc is not array-like
     else:
-        if hasattr(d, '__len__'):
-            loc = [loc] * len(d)
-
-        else: # if d and tc is not array-like
+        if not hasattr(d, '__len__'): # if d and tc is not array-like
             d = [d]
             tc = [tc]
+        # the same location is used for all 'd' and 'tc'
+        loc = [loc]
+
 
+    d = np.asarray(d, dtype=float)
+    tc = np.asarray(tc, dtype=float)
 
     circumference = 40075 #km
-    if any(np.array(d) > circumference / 2):
+    if np.any(d > circumference / 2):
         raise ValueError("Distance must be smaller "
                          f"than {circumference / 2}.")
 
-    if any(np.logical_or(np.array(tc) < 0, np.array(tc) > 2 * np.pi)):
+    if np.any((tc < 0) | (tc > 2 * np.pi)):
         raise ValueError("Direction must be between 0 to 2 * Pi.")
 
     loc = np.array([l.split(",") for l in loc], dtype=float)
-    d = np.array(d)
-    tc = np.array(tc)
+    lat_lon = _get_lat_lon_array(loc, d, tc)
+
+    return np.array(_format_lat_lon(lat_lon))
+
+def _get_lat_lon_array(loc, d, tc):
+    """Calculate the latitudes and longitudes of places
+    that are 'd' km away from 'loc' in directions 'tc'.
 
+    Same as get_lat_lon, but on arrays of floats without any validation.
+
+    Parameters
+    ----------
+    loc: numpy array of float, [2] | [n_places, 2]
+        Latitude and longitude of a location (or locations) in degrees.
+    d: numpy array of float, [n_places]
+        Distances in km from 'loc'.
+    tc: numpy array of float, [n_places]
+        Directions in radians.
+
+    Returns
+    -------
+    lat_lon: numpy array of float, [n_places, 2]
+        Latitudes and longitudes of the places in degrees.
+    """
     # convert from km to radians
     r = 6371 # radius of the earth in km
     d = d / r
 
     loc = loc * np.pi / 180
-    lat1 = loc[:, 0]
-    lon1 = loc[:, 1]
-
-    lat = np.arcsin(np.sin(lat1) * np.cos(d)
-          + np.cos(lat1) * np.sin(d) * np.cos(tc))
-    dlon = np.arctan2(np.sin(tc) * np.sin(d) * np.cos(lat1),
-                      np.cos(d) - np.sin(lat1) * np.sin(lat))
-    lon = (lon1 - dlon + np.pi) % (2 * np.pi) - np.pi
-
-    lat_lon = (pd.Series((lat * 180 / np.pi), dtype=str) + "," +
-               pd.Series((lon * 180 / np.pi), dtype=str))
-
+    lat1 = loc[..., 0]
+    lon1 = loc[..., 1]
+
+    # each sine and cosine is computed only once, and the formulas below
+    # are evaluated in place in a few buffers instead of allocating a new
+    # array for every intermediate result
+    sin_lat1 = np.sin(lat1)
+    cos_lat1 = np.cos(lat1)
+    sin_d = np.sin(d)
+    cos_d = np.cos(d, out=d)
+
+    # sin(lat) = sin(lat1) * cos(d) + cos(lat1) * sin(d) * cos(tc)
+    sin_lat = np.multiply(sin_lat1, cos_d)
+    buffer = np.multiply(cos_lat1, sin_d)
+    buffer *= np.cos(tc)
+    sin_lat += buffer
+
+    # dlon = arctan2(sin(tc) * sin(d) * cos(lat1),
+    #                cos(d) - sin(lat1) * sin(lat)),
+    # using sin(lat) as computed above rather than sin(arcsin(...))
+    dlon = np.sin(tc)
+    dlon *= sin_d
+    dlon *= cos_lat1
+    np.multiply(sin_lat1, sin_lat, out=buffer)
+    np.subtract(cos_d, buffer, out=buffer)
+    np.arctan2(dlon, buffer, out=dlon)
+
+    lat = np.arcsin(sin_lat, out=sin_lat)
+
+    # lon = (lon1 - dlon + pi) % (2 * pi) - pi, computed in 'dlon'
+    lon = np.subtract(lon1, dlon, out=dlon)
+    lon += np.pi
+    lon %= 2 * np.pi
+    lon -= np.pi
+
+    lat_lon = np.empty((len(lat), 2))
+    np.multiply(lat, 180, out=lat_lon[:, 0])
+    np.multiply(lon, 180, out=lat_lon[:, 1])
+    lat_lon /= np.pi
     return lat_lon
 
-def is_gsv_available(API_key, loc, search_radius, outdoor, limit=None):
+def _format_lat_lon(lat_lon):
+    """Format an [n_places, 2] array of latitudes and longitudes
+    into a list of comma-separated {latitude,longitude} pairs."""
+    return [f"{lat},{lon}" for lat, lon in lat_lon.tolist()]
+
+def is_gsv_available(API_key, loc, search_radius, outdoor, limit=None,
+                     n_jobs=10, executor=None):
     """Check if Google street view image is available given location(s).
     Check https://developers.google.com/maps/documentation/streetview/metadata
     for details of Google Map API used in this function.
@@ -160,7 +256,7 @@ def is_gsv_available(API_key, loc, search_radius, outdoor, limit=None):
     ----------
     API_key: str
         Key for Google Map API.
-    loc: numpy.chararray
+    loc: array-like of str
         Location(s) specified by latitude and longitude.
         Each location needs to be a comma-separated {latitude,longitude} pair;
         e.g. "40.714728,-73.998672"
@@ -173,44 +269,88 @@ def is_gsv_available(API_key, loc, search_radius, outdoor, limit=None):
         The number of "OK" status of locations after which
         the function stops checking the status of further locations.
         If None, the status of all the given locations are checked and returned.
+    n_jobs: int, optional (default=10)
+        The number of locations whose status is checked concurrently.
+        Ignored if 'executor' is given.
+    executor: concurrent.futures.ThreadPoolExecutor, optional (default=None)
+        Executor in which the status is checked.
+        Reusing one executor across calls also reuses the connections
+            kept alive by its threads.
+        If None, a new executor with 'n_jobs' threads is used for this call.
 
     Returns
     -------
     availability: list of boolean
         A list of whether a Google street view image is available
         around specific location(s).
+
+    Raises
+    ------
+    IOError
+        If a status cannot be retrieved: at once for an HTTP error other
+        than 429 or 5xx, e.g. 403 for an invalid key, and otherwise after
+        10 attempts backing off between them.
     """
     if limit == None:
         limit = len(loc)
 
     prefix = "https://maps.googleapis.com/maps/api/streetview/metadata?"
-    location = "location=" + loc
     if outdoor:
         source = "&source=outdoor"
     else:
         source = ""
     radius = "&radius=" + str(search_radius)
     key = "&key=" + API_key
+    suffix = source + radius + key
 
-    urls = prefix + location + source + radius + key
+    urls = [f"{prefix}location={location}{suffix}" for location in loc]
 
-    availability = [False]*len(urls)
-    count = 0
-    for i, url in enumerate(urls):
-        while True:
+    # set once enough locations are available, so that the checks still
+    # running stop retrying instead of requesting statuses nobody reads
+    stop = threading.Event()
+
+    def check_status(url):
+        n_failures = 0
+        while not stop.is_set():
             try:
                 # get API response
-                response = urllib.request.urlopen(url)
-            except IOError:
-                pass # retry
+                response = _http.get(url)
+            except IOError as e:
+                n_failures += 1
+                if not _is_transient(e) or n_failures >= _MAX_ATTEMPTS:
+                    raise
+                # retry, backing off so that concurrent workers do not keep
+                # hitting the API while it is rate limiting or unavailable
+                stop.wait(_retry_delay(n_failures))
             else: # if no IOError occurs
-                status = json.loads(response.read().decode('utf-8'))['status']
-                availability[i] = (status=='OK')
+                status = _json.loads(response)['status']
+                return status == 'OK'
+        return False
+
+    # the requests are sent concurrently, but their results are still
+    # taken in order so that the checks stop at the same location as before
+    availability = [False]*len(urls)
+    count = 0
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=n_jobs)
+    try:
+        futures = [executor.submit(check_status, url) for url in urls]
+        for i, future in enumerate(futures):
+            availability[i] = future.result()
+            if availability[i]:
+                count += 1
+            if count == limit:
+                # the status of the remaining locations is not needed
+                for remaining in futures[i + 1:]:
+                    remaining.cancel()
                 break
-        if availability[i]:
-            count += 1
-        if count == limit:
-            return availability
+    finally:
+        # return without waiting for the requests still in flight, whose
+        # results are discarded once they complete; they are not retried
+        stop.set()
+        if own_executor:
+            executor.shutdown(wait=False)
     return availability
 
 def get_street_view_image(directory_name, API_key, IDs,
@@ -275,8 +415,10 @@ def get_street_view_image(directory_name, API_key, IDs,
         n_images * limit would be the number of candidate locations
         to check if GSV available around the area.
     n_jobs: int, optional (default=1)
-        The number of processes (=number of CPU cores) to use.
-        Specify -1 to use all available cores.
+        The number of IDs whose images are retrieved concurrently.
+        Specify -1 to use as many as the CPU cores.
+        Since the retrieval mostly waits on the network, threads are used,
+        so values larger than the number of CPU cores are fine.
     verbose: boolean, optional (default=True)
         Whether or not to print the progress bar of the data retrieval.
     """
@@ -284,10 +426,43 @@ def get_street_view_image(directory_name, API_key, IDs,
         raise ValueError("The lengths of IDs and latitude_longitude have"
                          "to be same.")
 
+    # indexed by position below, whatever the index of the given Series;
+    # the images of an ID listed more than once are retrieved only once,
+    # around its first location, as they are saved in the same directory
+    locations = dict()
+    for ID, location in zip(IDs, latitude_longitude):
+        locations.setdefault(str(ID), location)
+    IDs = list(locations)
+    latitude_longitude = list(locations.values())
+
     # create directory in which all the images are saved
     if not os.path.exists(directory_name):
         os.makedirs(directory_name)
 
+    # files retrieved in previous runs, scanned once instead of listing
+    # each sub-directory separately
+    existing_dirs = dict()
+    with os.scandir(directory_name) as it:
+        for entry in it:
+            if entry.is_dir():
+                with os.scandir(entry.path) as files:
+                    existing_dirs[entry.name] = {f.name for f in files}
+
+    # parts of the URLs shared by all the images; check
+    # https://developers.google.com/maps/documentation/streetview/intro
+    # for details of API
+    prefix = "https://maps.googleapis.com/maps/api/streetview?"
+    size = "&size=" + image_size
+    fov = "&fov=" + str(field_of_view)
+    pitch = "&pitch=" + str(angle)
+    radius = "&radius=" + str(search_radius)
+    if outdoor:
+        source = "&source=outdoor"
+    else:
+        source = ""
+    key = "&key=" + API_key
+    suffix = fov + pitch + radius + source + key
+
     @contextlib.contextmanager
     def tqdm_joblib(tqdm_object):
         """Context manager to patch joblib to report into tqdm progress bar"""
@@ -316,130 +491,146 @@ def get_street_view_image(directory_name, API_key, IDs,
         sub_dir = f"{directory_name}/{id_}"
 
         # if the sub-directory doesn't exist, create a new one
-        if not os.path.exists(sub_dir):
-            os.mkdir(sub_dir)
+        if id_ not in existing_dirs:
+            os.makedirs(sub_dir, exist_ok=True)
+            existing_files = set()
             n_existing_images = 0
 
         else: # if there are already n_images png images in the sub-directory
-            n_existing_images = len(fnmatch.filter(os.listdir(sub_dir),
-                                                   '*.png'))
-            if n_existing_images == n_images: # if there are 'n_images' images in the sub directory
+            existing_files = existing_dirs[id_]
+            n_existing_images = sum(name.endswith(".png")
+                                    for name in existing_files)
+            if n_existing_images >= n_images: # if there are 'n_images' images or more in the sub directory
                 return
             else: # if there are some images saved previously, but less than 'n_images'
                 pass
 
+        center = np.array(loc.split(","), dtype=float)
+        rng = np.random.default_rng(seeds[i])
+
         # randomly pick 'n_needed_images' locations within 'radius' km radius
         n_needed_images = n_images - n_existing_images
-        count = n_needed_images
-        trial_count = 0
-        candidate_multiple = 1.5
+        n_tried = 0
+        n_succeeded = 0
+        loc_valid = []
         while True:
-            # randomly pick 'n_needed_images' * 'candidate_multiple'
-            # candidates for locations around 'loc'
-            direction = npr.uniform(0, 2 * np.pi,
-                                    int(n_images * candidate_multiple))
-            distance = (np.sqrt(npr.uniform(0,
-                                            1,
-                                            int(n_images * candidate_multiple)))
-                                            * rad)
-            lat_lon = get_lat_lon(loc, distance, direction)
-            # check if GSV is available for randonly picked
-            # 'n_needed_images' * 'candidate_multiple' locations
+            # randomly pick as many candidates for locations around 'loc' as
+            # expected to contain the missing ones, given the share of
+            # candidates with GSV available so far (Laplace-smoothed)
+            n_missing = n_needed_images - len(loc_valid)
+            success_rate = (n_succeeded + 1) / (n_tried + 2)
+            n_candidates = min(int(np.ceil(n_missing / success_rate)),
+                               max(n_images * limit - n_tried, 1))
+            direction = rng.uniform(0, 2 * np.pi, n_candidates)
+            distance = np.sqrt(rng.uniform(0, 1, n_candidates)) * rad
+            lat_lon = np.array(_format_lat_lon(
+                _get_lat_lon_array(center, distance, direction)))
+            # check if GSV is available for the randomly picked locations
             available = is_gsv_available(API_key, lat_lon, search_radius,
-                                         outdoor, n_images)
-            loc_valid_new = lat_lon[available].reset_index(drop=True)
-            try: # case of the non-first loop
-                loc_valid = loc_valid.append(loc_valid_new, ignore_index)
-            except NameError: # case of the first loop
-                loc_valid = loc_valid_new
+                                         outdoor, n_missing,
+                                         executor=metadata_executor)
+            loc_valid_new = lat_lon[available].tolist()
+            loc_valid.extend(loc_valid_new)
+            n_tried += n_candidates
+            n_succeeded += len(loc_valid_new)
             if len(loc_valid) >= n_needed_images: # when having enough locations
-                loc_valid = loc_valid[:n_needed_images]
-                count = 0
                 break
             # if there are not enough locations where GSV images are available
-            elif n_images * limit < trial_count:
-                print(f"After checking {trial_count} locations for GSV images,"
-                      f"only {len(loc_valid)}"
-                      f"+ pre-existing {n_existing_images}"
+            elif n_tried >= n_images * limit:
+                print(f"After checking {n_tried} locations for GSV images, "
+                      f"only {len(loc_valid)} "
+                      f"+ pre-existing {n_existing_images} "
                       f"GSV images found around the location where id_ = {id_}")
-                count -= len(loc_valid_new)
                 break
-            # if not enough available locations are randomly chosen yet
-            else:
-                trial_count += n_images * candidate_multiple
-                count -= len(loc_valid_new)
 
         # crate URLs
-        # check
-        # https://developers.google.com/maps/documentation/streetview/intro
-        # for details of API
-        prefix = "https://maps.googleapis.com/maps/api/streetview?"
-        location = "location=" + loc_valid
-        size = "&size=" + image_size
         if camera_direction == -2:
-            heading = ""
+            headings = [""] * len(loc_valid)
         elif camera_direction == -1:
-            heading = ("&heading="
-                       + pd.Series(npr.uniform(0,
-                                               360,
-                                               len(location)).astype(str)))
+            headings = [f"&heading={heading}"
+                        for heading in rng.uniform(0, 360, len(loc_valid))]
         else: #when camera_direction is given
-            heading = "&heading=" + pd.Series(camera_direction)
-        fov = "&fov=" + str(field_of_view)
-        pitch = "&pitch=" + str(angle)
-        radius = "&radius=" + str(search_radius)
-        if outdoor:
-            source = "&source=outdoor"
-        else:
-            source = ""
-        key = "&key=" + API_key
-
-        urls = (prefix + location + size + heading + fov
-                + pitch + radius + source + key)
+            headings = [f"&heading={camera_direction}"] * len(loc_valid)
+        urls = [f"{prefix}location={location}{size}{heading}{suffix}"
+                for location, heading in zip(loc_valid, headings)]
 
         # add digital signature if provided
         if secret is not None:
             urls = sign_url(urls, secret)
 
         # get and save Street View images using Google Street View Static API
+        # pick file names unused in the listing of the sub-directory first,
+        # then download the images concurrently
         new_file_names = [""]*len(urls)
         j = 0
-        for k, url in enumerate(urls):
-            while True: # find unused file name
-                file_name = f"{sub_dir}/image{j}.png"
-                if os.path.exists(file_name):
-                    j += 1
-                else:
-                    new_file_names[k] = f"image{j}.png"
-                    break
-
+        for k in range(len(urls)):
+            while f"image{j}.png" in existing_files:
+                j += 1
+            new_file_names[k] = f"image{j}.png"
+            j += 1
+
+        def download_image(url, file_name):
+            n_failures = 0
             while True:
                 try:
-                    # get API response
-                    image = urllib.request.urlopen(url).read()
-                except IOError:
-                    pass # retry
+                    # save the png image from API response
+                    _http.download(url, file_name)
+                except IOError as e:
+                    # retry with backoff, as in check_status
+                    n_failures += 1
+                    if not _is_transient(e) or n_failures >= _MAX_ATTEMPTS:
+                        raise
+                    time.sleep(_retry_delay(n_failures))
                 else:
-                    # save the png image
-                    with open(file_name, mode="wb") as f:
-                        f.write(image)
                     break
 
+        futures = [download_executor.submit(download_image, url,
+                                            f"{sub_dir}/{name}")
+                   for url, name in zip(urls, new_file_names)]
+        # wait for all the downloads, so that loc.csv lists every saved
+        # image even if some of them failed
+        errors = [future.exception() for future in futures]
+
         # save a CSV file that contains location information
         # about the saved street view images
-        loc_data = pd.DataFrame({'name': new_file_names,
-                                 'location': loc_valid})
-
-        csv_path = f"{sub_dir}/loc.csv"
-        if os.path.exists(csv_path):
-            with open(csv_path, "a") as f:
-                loc_data.to_csv(f, index=False, header=False)
-        else:
-            with open(csv_path, 'w') as f:
-                loc_data.to_csv(f, index=False)
-
-    if verbose: # with progress bar
-        with tqdm_joblib(tqdm(desc='Data Retrieval Progress', total=len(IDs))) as progress_bar:
-            Parallel(n_jobs) (delayed(collect_gsv_images_for_each_id)(i) for i in range(len(IDs)))
-    else: # without progress bar
-        Parallel(n_jobs) (delayed(collect_gsv_images_for_each_id)(i) for i in range(len(IDs)))
+        with open(f"{sub_dir}/loc.csv", "a", newline="") as f:
+            writer = csv.writer(f, lineterminator="\n")
+            if "loc.csv" not in existing_files:
+                writer.writerow(["name", "location"])
+            writer.writerows(
+                (name, location) for name, location, error
+                in zip(new_file_names, loc_valid, errors) if error is None)
+
+        # report the first failed download, once the others are saved
+        for error in errors:
+            if error is not None:
+                raise error
+
+    # each ID draws its random locations from its own generator, seeded from
+    # numpy's global random state, so that np.random.seed still makes the
+    # retrieval reproducible whatever the order in which the threads run
+    seeds = np.random.SeedSequence(
+        np.random.randint(2**32, size=4, dtype=np.uint64)).spawn(len(IDs))
+
+    def collect_or_report(i):
+        # an unexpected error for one ID, e.g. a malformed API response,
+        # does not stop the retrieval for the others; the missing images
+        # are retrieved when the function is run again
+        try:
+            collect_gsv_images_for_each_id(i)
+        except Exception as e:
+            print(f"Failed to retrieve GSV images for id_ = {IDs[i]}: {e!r}")
+
+    # the availability checks and the images are sent from threads shared
+    # by all the IDs, so that their persistent connections are reused from
+    # one ID to the next; the checks of each ID keep running 10 at a time
+    with ThreadPoolExecutor(max_workers=10 * joblib.effective_n_jobs(n_jobs)) \
+            as metadata_executor, \
+            ThreadPoolExecutor(max_workers=16) as download_executor:
+        if verbose: # with progress bar
+            with tqdm_joblib(tqdm(desc='Data Retrieval Progress', total=len(IDs))) as progress_bar:
+                Parallel(n_jobs, prefer="threads", batch_size=1) (
+                    delayed(collect_or_report)(i) for i in range(len(IDs)))
+        else: # without progress bar
+            Parallel(n_jobs, prefer="threads", batch_size=1) (
+                delayed(collect_or_report)(i) for i in range(len(IDs)))
@@ -14,4 +14,5 @@ setup(
     license='MIT',
     packages=find_packages(exclude=('tests')),
     install_requires=['numpy', 'pandas', 'tqdm', 'joblib'],
+    extras_require={'fast': ['orjson', 'pyarrow']},
 )
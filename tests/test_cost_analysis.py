@@ -1,5 +1,8 @@
+import json
+import os
+import tempfile
 import unittest
-from gmap_retrieval.cost_analysis import calculate_cost
+from gmap_retrieval.cost_analysis import calculate_cost, get_n_api_calls
 import pandas as pd
 
 
@@ -48,7 +51,48 @@ class CostAnalysisTest(unittest.TestCase):
             self.assertEqual(result2[idx], cost2[idx])
 
     def testGetNAPICalls(self):
-        return
+        with tempfile.TemporaryDirectory() as tmp:
+            # two locations with one satellite image each
+            satellite = f"{tmp}/satellite"
+            os.makedirs(satellite)
+            for id_ in ["1", "2"]:
+                open(f"{satellite}/{id_}.png", "wb").close()
+            open(f"{satellite}/image_coverage.csv", "w").close()
+
+            # 0, 20 and 45 results need 1, 1 and 3 nearby search requests
+            nearby_places = f"{tmp}/nearby_places"
+            n_results = {"1": {"bar": 0, "cafe": 20},
+                         "2": {"bar": 45, "cafe": 20}}
+            for id_, types in n_results.items():
+                os.makedirs(f"{nearby_places}/{id_}")
+                for p_type, n in types.items():
+                    with open(f"{nearby_places}/{id_}/{p_type}.json",
+                              "w") as f:
+                        # empty files are saved for ZERO_RESULTS responses
+                        if n > 0:
+                            json.dump({"results": [{}] * n}, f)
+
+            street_view = f"{tmp}/street_view"
+            for id_, n in [("1", 3), ("2", 1)]:
+                os.makedirs(f"{street_view}/{id_}")
+                for j in range(n):
+                    open(f"{street_view}/{id_}/image{j}.png", "wb").close()
+                open(f"{street_view}/{id_}/loc.csv", "w").close()
+
+            reviews = f"{tmp}/reviews"
+            os.makedirs(reviews)
+            for place_id in ["a", "b", "c"]:
+                with open(f"{reviews}/{place_id}.json", "w") as f:
+                    json.dump({"result": {}}, f)
+
+            result = get_n_api_calls(2, satellite, nearby_places,
+                                     street_view, reviews,
+                                     place_types=["bar", "cafe"])
+
+        self.assertEqual(result['static_maps'], 1)
+        self.assertEqual(result['nearby_search'], 3)
+        self.assertEqual(result['static_street_view'], 2)
+        self.assertEqual(result['places_details(atmosphere)'], 1.5)
 
 
 if __name__ == "__main__":
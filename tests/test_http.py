@@ -0,0 +1,95 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import tempfile
+import threading
+import unittest
+from gmap_retrieval import _http
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections alive
+
+    def do_GET(self):
+        self.server.ports.append(self.client_address[1])
+        if self.path.startswith("/missing"):
+            self.send_response(404)
+            body = b""
+        elif self.path.startswith("/redirect"):
+            self.send_response(302)
+            self.send_header("Location", self.path[len("/redirect"):])
+            body = b"moved"
+        elif self.path.startswith("/loop"):
+            self.send_response(302)
+            self.send_header("Location", "/loop")
+            body = b"moved"
+        elif self.path.startswith("/no-location"):
+            # a redirect status without a location to follow
+            self.send_response(302)
+            body = b"moved"
+        else:
+            self.send_response(200)
+            body = self.path.encode()
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HTTPTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.ports = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        _http._drop_connection("http", self.url[len("http://"):])
+
+    def testGet(self):
+        self.assertEqual(_http.get(f"{self.url}/a?x=1"), b"/a?x=1")
+        self.assertEqual(_http.get(f"{self.url}/b"), b"/b")
+        # both requests were sent through the same connection
+        self.assertEqual(len(set(self.server.ports)), 1)
+
+    def testGetErrorStatus(self):
+        with self.assertRaises(IOError):
+            _http.get(f"{self.url}/missing")
+
+    def testGetRedirect(self):
+        self.assertEqual(_http.get(f"{self.url}/redirect/a"), b"/a")
+        # the redirect and its target were sent through the same connection
+        self.assertEqual(len(set(self.server.ports)), 1)
+
+        with self.assertRaises(IOError):
+            _http.get(f"{self.url}/loop")
+        with self.assertRaises(IOError):
+            _http.get(f"{self.url}/no-location")
+
+    def testDownload(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            _http.download(f"{self.url}/a", f"{tmp}/a.png")
+            with open(f"{tmp}/a.png", "rb") as f:
+                self.assertEqual(f.read(), b"/a")
+
+            # a failed download leaves no file behind
+            with self.assertRaises(IOError):
+                _http.download(f"{self.url}/missing", f"{tmp}/b.png")
+            self.assertEqual(os.listdir(tmp), ["a.png"])
+
+            # the body of a redirect is not saved as the image
+            _http.download(f"{self.url}/redirect/c", f"{tmp}/c.png")
+            with open(f"{tmp}/c.png", "rb") as f:
+                self.assertEqual(f.read(), b"/c")
+            with self.assertRaises(IOError):
+                _http.download(f"{self.url}/no-location", f"{tmp}/d.png")
+            self.assertEqual(sorted(os.listdir(tmp)), ["a.png", "c.png"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from gmap_retrieval import _http, _json
+from gmap_retrieval.cost_analysis import get_n_api_calls
+from gmap_retrieval.nearby_places import (create_csv_nearby_places,
+                                          get_nearby_places,
+                                          load_saved_results)
+
+
+class NearbyPlacesTest(unittest.TestCase):
+    def testGetNearbyPlacesDuplicates(self):
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.object(_http, "get",
+                                  return_value=b'{"status": "ZERO_RESULTS"}'
+                                  ) as get:
+            get_nearby_places(tmp, "KEY", [1, 2, 1],
+                              ["40.752937,-73.977240", "51.531090,-0.125752",
+                               "35.681463,139.767157"],
+                              place_types=["bar", "cafe"], n_jobs=2,
+                              verbose=False)
+            # the places around an ID listed twice are searched only once
+            self.assertEqual(get.call_count, 4)
+            self.assertEqual(sorted(os.listdir(tmp)), ["1", "2"])
+            self.assertTrue(all("location=35.68" not in c.args[0]
+                                for c in get.call_args_list))
+
+    def testLoadSavedResultsCache(self):
+        result = {"name": "a", "place_id": "a", "types": ["bar"],
+                  "geometry": {"location": {"lat": 0, "lng": 0}}}
+        with tempfile.TemporaryDirectory() as tmp:
+            places = f"{tmp}/places"
+            for id_ in ["1", "2"]:
+                os.makedirs(f"{places}/{id_}")
+                _json.dump({"status": "OK", "results": [result]},
+                           f"{places}/{id_}/bar.json")
+                open(f"{places}/{id_}/cafe.json", "wb").close()
+            for dir_name in ["satellite", "reviews"]:
+                os.makedirs(f"{tmp}/{dir_name}")
+
+            with mock.patch.object(_json, "loads",
+                                   side_effect=_json.loads) as loads:
+                # the files are decoded every time without a cache
+                load_saved_results(f"{places}/1", ["bar", "cafe"])
+                load_saved_results(f"{places}/1", ["bar", "cafe"])
+                self.assertEqual(loads.call_count, 2)
+
+                # the second pass over the files skips decoding them
+                loads.reset_mock()
+                cache = dict()
+                df = create_csv_nearby_places(places, ["bar", "cafe"],
+                                              cache=cache)
+                self.assertEqual(len(df), 2)
+                self.assertEqual(loads.call_count, 2)
+                n_api_calls = get_n_api_calls(
+                    2, f"{tmp}/satellite", places, 10, f"{tmp}/reviews",
+                    place_types=["bar", "cafe"],
+                    cache=cache)
+                self.assertEqual(n_api_calls["nearby_search"], 2)
+                self.assertEqual(loads.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
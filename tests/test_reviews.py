@@ -0,0 +1,22 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from gmap_retrieval import _http
+from gmap_retrieval.reviews import get_reviews
+
+
+class ReviewsTest(unittest.TestCase):
+    def testGetReviewsDuplicates(self):
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.object(_http, "get",
+                                  return_value=b'{"status": "OK"}') as get:
+            get_reviews(tmp, "KEY", ["a", "b", "a", "a"], n_jobs=2,
+                        verbose=False)
+            # a place listed more than once is requested only once
+            self.assertEqual(get.call_count, 2)
+            self.assertEqual(sorted(os.listdir(tmp)), ["a.json", "b.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()
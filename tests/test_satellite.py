@@ -0,0 +1,129 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from gmap_retrieval.satellite import find_zoom_level, get_satellite_image
+import numpy as np
+import pandas as pd
+
+
+class SatelliteTest(unittest.TestCase):
+    def testFindZoomLevel(self):
+        latitudes = pd.Series([40.752937, 51.531090, 35.681463, 60.171283])
+        zoom_levels, coverage = find_zoom_level(latitudes,
+                                                horizontal_coverage=2,
+                                                horizontal_size=640)
+        self.assertEqual(list(zoom_levels), [15, 15, 15, 15])
+        np.testing.assert_allclose(coverage, [2.316138, 1.902028,
+                                              2.483507, 1.520818], rtol=1e-6)
+
+        # the chosen coverage is the closest one in the squared ratio
+        for cov in coverage:
+            for other in [cov / 2, cov * 2]:
+                self.assertLessEqual(max(cov / 2, 2 / cov),
+                                     max(other / 2, 2 / other))
+
+        # the first and the last zoom levels have no neighbour to compare
+        zoom_levels, _ = find_zoom_level(pd.Series([0, 60]),
+                                         horizontal_coverage=100000,
+                                         horizontal_size=640)
+        self.assertEqual(list(zoom_levels), [0, 0])
+        zoom_levels, _ = find_zoom_level(pd.Series([0, 60]),
+                                         horizontal_coverage=0.001,
+                                         horizontal_size=640)
+        self.assertEqual(list(zoom_levels), [21, 21])
+
+    def testGetSatelliteImageCache(self):
+        def save_png(url, file_name):
+            with open(file_name, "wb") as f:
+                f.write(b"png")
+
+        locations = pd.Series(["40.752937,-73.977240", "51.531090,-0.125752"])
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch("gmap_retrieval._http.download",
+                           side_effect=save_png) as get:
+            cache_dir = f"{tmp}/cache"
+            get_satellite_image(f"{tmp}/a", "KEY", pd.Series([1, 2]),
+                                locations, cache_dir=cache_dir, verbose=False)
+            self.assertEqual(get.call_count, 2)
+
+            # the same locations under other IDs are taken from the cache
+            get_satellite_image(f"{tmp}/b", "KEY", pd.Series([3, 4]),
+                                locations, cache_dir=cache_dir, verbose=False)
+            self.assertEqual(get.call_count, 2)
+            self.assertEqual(sorted(os.listdir(f"{tmp}/b")),
+                             ["3.png", "4.png", "image_coverage.csv"])
+            with open(f"{tmp}/b/4.png", "rb") as f:
+                self.assertEqual(f.read(), b"png")
+
+    def testGetSatelliteImageDuplicates(self):
+        def save_png(url, file_name):
+            with open(file_name, "wb") as f:
+                f.write(url.encode())
+
+        locations = pd.Series(["40.752937,-73.977240", "51.531090,-0.125752",
+                               "40.752937,-73.977240"])
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch("gmap_retrieval._http.download",
+                           side_effect=save_png) as download:
+            get_satellite_image(tmp, "KEY", pd.Series([1, 2, 3]), locations,
+                                n_jobs=3, verbose=False)
+            # IDs at the same location share a single request
+            self.assertEqual(download.call_count, 2)
+            with open(f"{tmp}/1.png", "rb") as f1, \
+                    open(f"{tmp}/3.png", "rb") as f3:
+                self.assertEqual(f1.read(), f3.read())
+            coverage = pd.read_csv(f"{tmp}/image_coverage.csv")
+            self.assertEqual(sorted(coverage["id"]), [1, 2, 3])
+
+        # the same ID given twice at the same location
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch("gmap_retrieval._http.download",
+                           side_effect=save_png) as download:
+            get_satellite_image(tmp, "KEY", pd.Series([1, 1]),
+                                locations[[0, 2]], verbose=False)
+            self.assertEqual(download.call_count, 1)
+            self.assertEqual(sorted(os.listdir(tmp)),
+                             ["1.png", "image_coverage.csv"])
+            coverage = pd.read_csv(f"{tmp}/image_coverage.csv")
+            self.assertEqual(list(coverage["id"]), [1, 1])
+
+    def testGetSatelliteImageRetry(self):
+        def save_png(url, file_name):
+            if len(download.call_args_list) < 3:
+                raise IOError("rate limited")
+            with open(file_name, "wb") as f:
+                f.write(b"png")
+
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch("gmap_retrieval._http.download",
+                           side_effect=save_png) as download, \
+                mock.patch("time.sleep") as sleep:
+            get_satellite_image(tmp, "KEY", pd.Series([1]),
+                                pd.Series(["40.752937,-73.977240"]),
+                                verbose=False)
+            self.assertEqual(download.call_count, 3)
+            self.assertEqual([c.args[0] for c in sleep.call_args_list],
+                             [0.5, 1])
+
+        # the delay stays capped however many times the download fails
+        def fail_long(url, file_name):
+            if len(download.call_args_list) <= 1100:
+                raise IOError("unavailable")
+            with open(file_name, "wb") as f:
+                f.write(b"png")
+
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch("gmap_retrieval._http.download",
+                           side_effect=fail_long) as download, \
+                mock.patch("time.sleep") as sleep:
+            get_satellite_image(tmp, "KEY", pd.Series([1]),
+                                pd.Series(["40.752937,-73.977240"]),
+                                verbose=False)
+            self.assertEqual(download.call_count, 1101)
+            self.assertEqual(max(c.args[0] for c in sleep.call_args_list),
+                             32)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,236 @@
+import base64
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import hashlib
+import hmac
+import io
+import numpy as np
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import urllib.error
+from gmap_retrieval import _http, street_view
+from gmap_retrieval.street_view import (get_lat_lon, get_street_view_image,
+                                        is_gsv_available, sign_url)
+
+
+class StreetViewTest(unittest.TestCase):
+    def testSignUrl(self):
+        secret = base64.urlsafe_b64encode(b"secret").decode()
+        url = ("https://maps.googleapis.com/maps/api/streetview?"
+               "location=40.714728,-73.998672&size=640x640&key=KEY")
+        digest = hmac.new(b"secret",
+                          b"/maps/api/streetview?location=40.714728,"
+                          b"-73.998672&size=640x640&key=KEY",
+                          hashlib.sha1).digest()
+        signed_url = (url + "&signature="
+                      + base64.urlsafe_b64encode(digest).decode())
+
+        self.assertEqual(sign_url(url, secret), [signed_url])
+        self.assertEqual(sign_url([url, url], secret), [signed_url] * 2)
+        with self.assertRaises(Exception):
+            sign_url(url)
+
+        # URLs sharing only part of their path and query, or none of it
+        urls = [url, url.replace("640x640", "400x400"),
+                "http://example.com/a;b?c=d#e"]
+        for signed_url, url in zip(sign_url(urls, secret), urls):
+            self.assertEqual(sign_url(url, secret)[0], signed_url)
+
+    def testGetLatLon(self):
+        d = np.array([0.5, 1.5, 3])
+        tc = np.array([0, np.pi / 2, 4])
+        lat_lon = list(get_lat_lon("40.752937,-73.977240", d, tc))
+        self.assertEqual(len(lat_lon), 3)
+        self.assertEqual(list(get_lat_lon("40.752937,-73.977240", 1.5, tc[1])),
+                         lat_lon[1:2])
+
+        # the places are 'd' km away from the location
+        lat1, lon1 = np.radians([40.752937, -73.977240])
+        lat2, lon2 = np.radians(np.array([x.split(",") for x in lat_lon],
+                                         dtype=float)).T
+        haversine = (np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1)
+                     * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+        np.testing.assert_allclose(
+            2 * 6371 * np.arcsin(np.sqrt(haversine)), d)
+
+        self.assertEqual(
+            list(get_lat_lon(["40.752937,-73.977240"] * 3, d, tc)), lat_lon)
+        with self.assertRaises(ValueError):
+            get_lat_lon("40.752937,-73.977240", d, tc[:2])
+
+    def testIsGsvAvailable(self):
+        def get(url):
+            # street view is available at even latitudes only
+            latitude = int(url.split("location=")[1].split(",")[0])
+            status = "OK" if latitude % 2 == 0 else "ZERO_RESULTS"
+            return f'{{"status": "{status}"}}'.encode()
+
+        loc = [f"{latitude},0" for latitude in range(10)]
+        with mock.patch.object(_http, "get", side_effect=get):
+            self.assertEqual(is_gsv_available("KEY", loc, 50, True),
+                             [True, False] * 5)
+            # the locations after the 'limit'-th available one are not
+            # reported as available
+            self.assertEqual(
+                is_gsv_available("KEY", loc, 50, True, limit=2, n_jobs=1),
+                [True, False, True] + [False] * 7)
+
+        # an executor given by the caller is reused, and so are the
+        # connections kept alive by its threads
+        threads = set()
+
+        def get_in_thread(url):
+            threads.add(threading.get_ident())
+            return get(url)
+
+        with mock.patch.object(_http, "get", side_effect=get_in_thread), \
+                ThreadPoolExecutor(max_workers=1) as executor:
+            for _ in range(2):
+                self.assertEqual(
+                    is_gsv_available("KEY", loc, 50, True, executor=executor),
+                    [True, False] * 5)
+        self.assertEqual(len(threads), 1)
+
+    def testIsGsvAvailableRetry(self):
+        def get(url):
+            if get_.call_count < 3:
+                raise IOError("rate limited")
+            return b'{"status": "OK"}'
+
+        with mock.patch.object(_http, "get", side_effect=get) as get_, \
+                mock.patch.object(street_view, "threading") as threading_:
+            stop = threading_.Event.return_value
+            stop.is_set.return_value = False
+            self.assertEqual(is_gsv_available("KEY", ["0,0"], 50, True),
+                             [True])
+            self.assertEqual(get_.call_count, 3)
+            self.assertEqual([c.args[0] for c in stop.wait.call_args_list],
+                             [0.5, 1])
+
+        def http_error(code):
+            return urllib.error.HTTPError("url", code, "error", None, None)
+
+        # an error that is not transient is not retried
+        with mock.patch.object(_http, "get",
+                               side_effect=http_error(403)) as get_:
+            with self.assertRaises(urllib.error.HTTPError):
+                is_gsv_available("KEY", ["0,0"], 50, True)
+            self.assertEqual(get_.call_count, 1)
+
+        # a transient error is retried a limited number of times
+        with mock.patch.object(_http, "get",
+                               side_effect=http_error(500)) as get_, \
+                mock.patch.object(street_view, "threading") as threading_:
+            stop = threading_.Event.return_value
+            stop.is_set.return_value = False
+            with self.assertRaises(urllib.error.HTTPError):
+                is_gsv_available("KEY", ["0,0"], 50, True)
+            self.assertEqual(get_.call_count, 10)
+            self.assertEqual([c.args[0] for c in stop.wait.call_args_list],
+                             [0.5, 1, 2, 4, 8, 16, 32, 32, 32])
+
+    def testIsGsvAvailableStop(self):
+        failed = threading.Event()
+
+        def get(url):
+            if url.split("location=")[1].startswith("1,"):
+                failed.set()
+                raise IOError("unavailable")
+            # answer only once the other request has failed, so that it is
+            # waiting to be retried when the limit is reached
+            failed.wait(5)
+            return b'{"status": "OK"}'
+
+        executor = ThreadPoolExecutor(max_workers=2)
+        with mock.patch.object(_http, "get", side_effect=get) as get_:
+            self.assertEqual(is_gsv_available("KEY", ["0,0", "1,0"], 50, True,
+                                              limit=1, executor=executor),
+                             [True, False])
+            # the failed request is not retried and its worker returns
+            shutdown = threading.Thread(target=executor.shutdown)
+            shutdown.start()
+            shutdown.join(5)
+            self.assertFalse(shutdown.is_alive())
+            self.assertEqual(get_.call_count, 2)
+
+    def testGetStreetViewImageRerun(self):
+        def save_png(url, file_name):
+            with open(file_name, "wb") as f:
+                f.write(b"png")
+
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.object(_http, "get",
+                                  return_value=b'{"status": "OK"}'), \
+                mock.patch.object(_http, "download",
+                                  side_effect=save_png) as download:
+            get_street_view_image(tmp, "KEY", [1], ["40.752937,-73.977240"],
+                                  n_images=3, verbose=False)
+            self.assertEqual(download.call_count, 3)
+
+            # rerunning with fewer images than already saved does nothing
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                get_street_view_image(tmp, "KEY", [1],
+                                      ["40.752937,-73.977240"], n_images=2,
+                                      verbose=False)
+            self.assertEqual(output.getvalue(), "")
+            self.assertEqual(download.call_count, 3)
+            self.assertEqual(sorted(os.listdir(f"{tmp}/1")),
+                             ["image0.png", "image1.png", "image2.png",
+                              "loc.csv"])
+
+    def testGetStreetViewImageDuplicates(self):
+        def save_png(url, file_name):
+            with open(file_name, "wb") as f:
+                f.write(b"png")
+
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.object(_http, "get",
+                                  return_value=b'{"status": "OK"}'), \
+                mock.patch.object(_http, "download",
+                                  side_effect=save_png) as download:
+            get_street_view_image(tmp, "KEY", [1, 1],
+                                  ["40.752937,-73.977240"] * 2, n_images=3,
+                                  n_jobs=2, verbose=False)
+            # the images of an ID listed twice are retrieved only once
+            self.assertEqual(download.call_count, 3)
+            self.assertEqual(sorted(os.listdir(f"{tmp}/1")),
+                             ["image0.png", "image1.png", "image2.png",
+                              "loc.csv"])
+            with open(f"{tmp}/1/loc.csv") as f:
+                self.assertEqual(len(f.readlines()), 4)
+
+    def testGetStreetViewImageFailedDownload(self):
+        def save_png(url, file_name):
+            if file_name.endswith("image1.png"):
+                raise urllib.error.HTTPError(url, 403, "Forbidden", None,
+                                             None)
+            with open(file_name, "wb") as f:
+                f.write(b"png")
+
+        output = io.StringIO()
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.object(_http, "get",
+                                  return_value=b'{"status": "OK"}'), \
+                mock.patch.object(_http, "download",
+                                  side_effect=save_png) as download, \
+                contextlib.redirect_stdout(output):
+            get_street_view_image(tmp, "KEY", [1], ["40.752937,-73.977240"],
+                                  n_images=3, verbose=False)
+            # the failed download is not retried, the other images are
+            # listed in loc.csv and the failure is reported
+            self.assertEqual(download.call_count, 3)
+            self.assertEqual(sorted(os.listdir(f"{tmp}/1")),
+                             ["image0.png", "image2.png", "loc.csv"])
+            with open(f"{tmp}/1/loc.csv") as f:
+                names = [line.split(",")[0] for line in f.readlines()]
+            self.assertEqual(names, ["name", "image0.png", "image2.png"])
+        self.assertIn("Failed to retrieve GSV images for id_ = 1",
+                      output.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()